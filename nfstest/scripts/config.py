@@ -1,8 +1,16 @@
 #!/usr/bin/env python3
-"""Shared configuration for NFS testing infrastructure."""
+"""Shared configuration for NFS testing infrastructure.
 
+Requires Python 3.10+ (Config is a slotted dataclass).
+"""
+
+import sys
+from dataclasses import dataclass
 from pathlib import Path
 
+if sys.version_info < (3, 10):
+    sys.exit("nfstest requires Python 3.10 or newer")
+
 # Get project root (two levels up from this script)
 SCRIPT_DIR = Path(__file__).parent.resolve()
 PROJECT_ROOT = SCRIPT_DIR.parent.parent
@@ -15,29 +23,66 @@ NFS_PORT = 4000
 QEMU_MEMORY = "512M"
 VM_SSH_PORT = 2222
 VM_PASSWORD = "nfstest"
+# Shared ssh master connection socket (%r/%h/%p are expanded by ssh)
+VM_SSH_CONTROL_PATH = "/tmp/nfstest-ssh-%r@%h:%p"
+# virtio-serial port the guest writes to once provisioning is done
+VM_READY_PORT = "nfstest.ready"
+# Internal qcow2 snapshot used to resume a provisioned VM (see warm-client)
+VM_SNAPSHOT_NAME = "provisioned"
+# SCRIPT_DIR is shared into the VM over virtio-9p and mounted here
+SCRIPTS_MOUNT_TAG = "nfstest_scripts"
+VM_SCRIPTS_DIR = "/opt/nfstest_scripts"
 
 # Script paths
 RUNNER_SCRIPT = SCRIPT_DIR / "runner.py"
 
 
+@dataclass(frozen=True, slots=True, init=False)
 class Config:
     """Runtime configuration from command line arguments.
 
     Defaults are provided by Makefile variables, so all parameters should be passed explicitly.
+    Paths are derived once in __init__; instances are immutable.
     """
 
+    # Docker configuration
+    image_name: str
+    image_tag: str
+    docker_image: str
+
+    # VM path configuration
+    vm_dir: Path
+    vm_image_name: str
+    cidata_name: str
+
+    vm_image: Path
+    vm_test_image: Path
+    vm_snapshot_stamp: Path
+    cidata_iso: Path
+    vm_log: Path
+    vm_monitor: Path
+    vm_ready_socket: Path
+
     def __init__(self, image_name, image_tag, vm_dir, vm_image, cidata):
+        # Frozen dataclass: fields have to be set bypassing __setattr__
+        def set_field(name, value):
+            object.__setattr__(self, name, value)
+
         # Docker configuration
-        self.image_name = image_name
-        self.image_tag = image_tag
-        self.docker_image = f"{self.image_name}:{self.image_tag}"
-
-        # VM path configuration
-        self.vm_dir = PROJECT_ROOT / vm_dir
-        self.vm_image_name = vm_image
-        self.cidata_name = cidata
-
-        self.vm_image = self.vm_dir / self.vm_image_name
-        self.vm_test_image = self.vm_dir / "vm-test.qcow2"
-        self.cidata_iso = self.vm_dir / self.cidata_name
-        self.vm_log = self.vm_dir / "vm.log"
+        set_field("image_name", image_name)
+        set_field("image_tag", image_tag)
+        set_field("docker_image", f"{image_name}:{image_tag}")
+
+        # VM path configuration (vm_dir may be a str, relative to PROJECT_ROOT)
+        vm_dir = PROJECT_ROOT / vm_dir
+        set_field("vm_dir", vm_dir)
+        set_field("vm_image_name", vm_image)
+        set_field("cidata_name", cidata)
+
+        set_field("vm_image", vm_dir / vm_image)
+        set_field("vm_test_image", vm_dir / "vm-test.qcow2")
+        set_field("vm_snapshot_stamp", vm_dir / "vm-test.snapshot-stamp")
+        set_field("cidata_iso", vm_dir / cidata)
+        set_field("vm_log", vm_dir / "vm.log")
+        set_field("vm_monitor", vm_dir / "qemu-monitor.sock")
+        set_field("vm_ready_socket", vm_dir / "vm-ready.sock")
@@ -2,16 +2,128 @@
 """NFS test infrastructure management CLI."""
 
 import argparse
+import functools
+import io
+import logging
+import os
+import selectors
+import socket
 import subprocess
 import sys
+import threading
 import time
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from config import Config, CONTAINER_NAME, NFS_PORT, QEMU_MEMORY, VM_SSH_PORT, VM_PASSWORD, RUNNER_SCRIPT, PROJECT_ROOT
+from config import (
+    Config, CONTAINER_NAME, NFS_PORT, QEMU_MEMORY, VM_SSH_PORT, VM_SSH_CONTROL_PATH, VM_PASSWORD,
+    VM_READY_PORT, VM_SNAPSHOT_NAME, VM_SCRIPTS_DIR, SCRIPTS_MOUNT_TAG, RUNNER_SCRIPT, SCRIPT_DIR
+)
 
+# Command echoes (info) and per-iteration polling progress (debug); the
+# level is set from --verbose/--quiet in main()
+log = logging.getLogger("nfstest")
 
-def run_command(cmd, check=True, shell=False, cwd=None, silent=False, stream=False):
+
+@functools.lru_cache(maxsize=None)
+def _which(program):
+    """Resolve a program on PATH (cached per process)."""
+    return shutil.which(program)
+
+
+def _have(program):
+    """Check if a program is available on PATH."""
+    return _which(program) is not None
+
+
+def _drain_pipes(process, echo):
+    """Read a process's stdout/stderr pipes until both are closed.
+
+    Chunks are read with os.read as soon as they are available and, if echo
+    is set, copied straight to our own stdout/stderr. Returns the captured
+    (stdout, stderr) as text, or None for a stream that wasn't piped.
+    """
+    captured = {}
+
+    with selectors.DefaultSelector() as selector:
+        for pipe, sink in ((process.stdout, sys.stdout), (process.stderr, sys.stderr)):
+            if pipe is not None:
+                captured[pipe] = bytearray()
+                selector.register(pipe, selectors.EVENT_READ, sink)
+
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fd, 65536)
+                if not data:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    continue
+                captured[key.fileobj] += data
+                if echo:
+                    # Flush pending text first so output stays in order
+                    key.data.flush()
+                    key.data.buffer.write(data)
+                    key.data.buffer.flush()
+
+    def decode(pipe):
+        if pipe is None:
+            return None
+        return captured[pipe].decode(errors="replace")
+
+    return decode(process.stdout), decode(process.stderr)
+
+
+class _ThreadOutput:
+    """Stand-in for sys.stdout that holds back the output of chosen threads.
+
+    Calls run through buffered() write to a private buffer; every other
+    thread writes to the real stdout as before.
+    """
+
+    def __init__(self):
+        self._stdout = sys.stdout
+        self._buffers = {}
+
+    def __getattr__(self, name):
+        # write/flush, and the byte-level buffer _drain_pipes echoes to,
+        # resolve to the calling thread's target
+        return getattr(self._buffers.get(threading.get_ident(), self._stdout), name)
+
+    def __enter__(self):
+        sys.stdout = self
+        # Log records (command echoes) go through the same per-thread routing
+        for handler in logging.getLogger().handlers:
+            if getattr(handler, "stream", None) is self._stdout:
+                handler.setStream(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        for handler in logging.getLogger().handlers:
+            if getattr(handler, "stream", None) is self:
+                handler.setStream(self._stdout)
+        sys.stdout = self._stdout
+
+    def buffered(self, func, *args):
+        """Call func(*args) with its output buffered; return (result, output)."""
+        ident = threading.get_ident()
+        self._buffers[ident] = io.TextIOWrapper(io.BytesIO(), encoding=self._stdout.encoding,
+                                                errors="replace", write_through=True)
+        try:
+            result = func(*args)
+        except BaseException:
+            # Don't lose the context of a failure
+            self._stdout.write(self._release(ident))
+            raise
+        return result, self._release(ident)
+
+    def _release(self, ident):
+        """Stop buffering for a thread and return what it wrote."""
+        buf = self._buffers.pop(ident)
+        return buf.buffer.getvalue().decode(buf.encoding, errors="replace")
+
+
+def run_command(cmd, check=True, shell=False, cwd=None, silent=False, stream=False, capture=False):
     """Run a command and return the result.
 
     Args:
@@ -21,15 +133,22 @@ def run_command(cmd, check=True, shell=False, cwd=None, silent=False, stream=Fal
         cwd: Working directory
         silent: If True, suppress all output except errors
         stream: If True, stream output directly to terminal (real-time), don't capture
+        capture: If True, keep stdout in the result even when silent
     """
     if isinstance(cmd, str) and not shell:
         cmd = cmd.split()
 
     cmd_str = ' '.join(cmd) if isinstance(cmd, list) else cmd
 
-    # Always print the command unless silent
+    # CPython only uses posix_spawn (instead of fork+exec) for an absolute
+    # executable with close_fds off, which is safe since fds are created
+    # non-inheritable
+    if not shell:
+        cmd = [_which(cmd[0]) or cmd[0], *cmd[1:]]
+
+    # Echo the command unless silent
     if not silent:
-        print(f"$ {cmd_str}")
+        log.info(f"$ {cmd_str}")
 
     # Stream mode: output goes directly to terminal
     if stream and not silent:
@@ -37,7 +156,8 @@ def run_command(cmd, check=True, shell=False, cwd=None, silent=False, stream=Fal
             cmd,
             check=False,
             shell=shell,
-            cwd=cwd
+            cwd=cwd,
+            close_fds=False
         )
 
         if check and result.returncode != 0:
@@ -45,23 +165,25 @@ def run_command(cmd, check=True, shell=False, cwd=None, silent=False, stream=Fal
 
         return result
 
-    # Capture mode: capture output then print
-    result = subprocess.run(
+    # Capture mode: capture output while streaming it. Silent calls discard what
+    # nobody will read; stderr is only kept when it may be shown on failure.
+    if silent:
+        stdout = subprocess.PIPE if capture else subprocess.DEVNULL
+        stderr = subprocess.PIPE if check else subprocess.DEVNULL
+    else:
+        stdout = stderr = subprocess.PIPE
+
+    process = subprocess.Popen(
         cmd,
-        check=False,
         shell=shell,
         cwd=cwd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True
+        stdout=stdout,
+        stderr=stderr,
+        close_fds=False
     )
-
-    # Print output unless silent
-    if not silent:
-        if result.stdout:
-            print(result.stdout, end='')
-        if result.stderr:
-            print(result.stderr, end='', file=sys.stderr)
+    # Output is echoed as it arrives unless silent
+    out, err = _drain_pipes(process, echo=not silent)
+    result = subprocess.CompletedProcess(cmd, process.wait(), out, err)
 
     if check and result.returncode != 0:
         if silent:
@@ -76,15 +198,35 @@ def run_command(cmd, check=True, shell=False, cwd=None, silent=False, stream=Fal
     return result
 
 
-def is_container_running(container_name):
-    """Check if a Docker container is running."""
-    print(f"Checking if container '{container_name}' is running...")
-    result = run_command(
-        ["docker", "ps", "--format", "{{.Names}}"],
-        check=False,
-        silent=True
+# How long (in seconds) a container status check stays valid
+CONTAINER_STATUS_TTL = 5
+
+
+@functools.lru_cache(maxsize=8)
+def _container_running_cached(container_name, bucket):
+    """Query Docker for a running container.
+
+    `bucket` is the current TTL window; it is only part of the cache key so
+    that results expire after CONTAINER_STATUS_TTL seconds.
+    """
+    result = subprocess.run(
+        ["docker", "ps", "-q", "--filter", f"name=^{container_name}$"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True
     )
-    is_running = container_name in result.stdout.splitlines()
+    return result.returncode == 0 and bool(result.stdout.strip())
+
+
+def is_container_running(container_name):
+    """Check if a Docker container is running.
+
+    Results are cached for CONTAINER_STATUS_TTL seconds so repeated checks
+    within one CLI invocation don't each pay a `docker ps` round-trip.
+    """
+    log.debug(f"Checking if container '{container_name}' is running...")
+    bucket = int(time.monotonic() // CONTAINER_STATUS_TTL)
+    is_running = _container_running_cached(container_name, bucket)
     if is_running:
         print(f"✓ Container '{container_name}' is running")
     else:
@@ -94,11 +236,12 @@ def is_container_running(container_name):
 
 def is_vm_running():
     """Check if the VM is running."""
-    print("Checking if VM is running...")
-    result = run_command(
+    log.debug("Checking if VM is running...")
+    result = subprocess.run(
         ["pgrep", "-f", "qemu-system-x86_64.*vm-test.qcow2"],
-        check=False,
-        silent=True
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True
     )
     is_running = result.returncode == 0
     if is_running:
@@ -108,29 +251,125 @@ def is_vm_running():
     return is_running
 
 
+def check_port(host, port, timeout=0.5):
+    """Check if a port is reachable."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            return sock.connect_ex((host, port)) == 0
+    except OSError:
+        return False
+
+
 def wait_for_port(host, port, timeout=30, description="service"):
-    """Wait for a port to be available."""
+    """Wait for a port to be available.
+
+    Polls with exponential backoff (50ms up to 1s) so a service that comes up
+    quickly is detected without waiting a full second.
+    """
     print(f"Waiting for {description} on {host}:{port} (timeout: {timeout}s)...")
 
-    for i in range(timeout):
-        result = run_command(
-            ["nc", "-z", host, str(port)],
-            check=False,
-            silent=True
-        )
-        if result.returncode == 0:
-            print(f"✓ {description.capitalize()} is ready after {i+1}s")
+    start_time = time.monotonic()
+    delay = 0.05
+    next_report = 5
+
+    while True:
+        if check_port(host, port):
+            elapsed = time.monotonic() - start_time
+            print(f"✓ {description.capitalize()} is ready after {elapsed:.1f}s")
             return True
 
-        if (i + 1) % 5 == 0:
-            print(f"  Still waiting... ({i+1}s elapsed)")
+        elapsed = time.monotonic() - start_time
+        if elapsed >= timeout:
+            break
+
+        if elapsed >= next_report:
+            log.debug(f"  Still waiting... ({int(elapsed)}s elapsed)")
+            next_report += 5
 
-        time.sleep(1)
+        time.sleep(min(delay, timeout - elapsed))
+        delay = min(delay * 2, 1.0)
 
     print(f"✗ ERROR: {description} not available after {timeout}s", file=sys.stderr)
     return False
 
 
+def wait_for_log_marker(log_path, marker, timeout, interval=0.25):
+    """Wait for a marker string to appear in a growing log file.
+
+    The file is kept open and only newly appended bytes are read on each
+    poll, so the cost per iteration doesn't grow with the log size.
+    """
+    marker = marker.encode()
+    # Keep enough of the previous chunk to catch a marker split across reads
+    carry_len = len(marker) - 1
+    deadline = time.monotonic() + timeout
+    log_file = None
+    tail = b""
+
+    try:
+        while time.monotonic() < deadline:
+            if log_file is None:
+                try:
+                    log_file = open(log_path, "rb")
+                except FileNotFoundError:
+                    # QEMU hasn't created the log yet, retry
+                    log.debug(f"  {log_path} not created yet, retrying...")
+
+            if log_file is not None:
+                chunk = log_file.read()
+                if chunk:
+                    data = tail + chunk
+                    if marker in data:
+                        return True
+                    tail = data[-carry_len:] if carry_len else b""
+
+            time.sleep(interval)
+    finally:
+        if log_file is not None:
+            log_file.close()
+
+    return False
+
+
+def wait_for_ready_channel(socket_path, marker, deadline):
+    """Block until the guest writes a marker to its ready channel.
+
+    QEMU listens on socket_path for the host side of a virtio-serial port.
+    Raises OSError if the socket can't be connected to before the deadline.
+    """
+    marker = marker.encode()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        # QEMU creates the socket during startup, so allow a short retry
+        while True:
+            try:
+                sock.connect(str(socket_path))
+                break
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise
+                log.debug(f"  Ready channel not up yet ({e}), retrying...")
+                time.sleep(0.1)
+
+        data = b""
+        while marker not in data:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            sock.settimeout(remaining)
+            try:
+                chunk = sock.recv(4096)
+            except socket.timeout:
+                return False
+            if not chunk:
+                # QEMU exited
+                return False
+            data = data[-len(marker):] + chunk
+
+    return True
+
+
 def start_server(cfg):
     """Start NFS server Docker container (assumes image is already built)."""
     print("=" * 60)
@@ -156,6 +395,8 @@ def start_server(cfg):
         "-p", f"{NFS_PORT}:{NFS_PORT}",
         cfg.docker_image
     ])
+    # Container state changed - drop any cached status
+    _container_running_cached.cache_clear()
     print(f"✓ NFS server container started in background")
     print()
     return 0
@@ -168,25 +409,175 @@ def stop_server():
     print("=" * 60)
     print()
 
-    print(f"[1/2] Stopping container '{CONTAINER_NAME}'...")
-    result = run_command(["docker", "stop", CONTAINER_NAME], check=False, silent=True)
+    # rm -f stops (kills) and removes the container in a single API call
+    print(f"Stopping and removing container '{CONTAINER_NAME}'...")
+    result = run_command(["docker", "rm", "-f", "--volumes", CONTAINER_NAME], check=False, silent=True)
     if result.returncode == 0:
-        print("✓ Container stopped")
+        print("✓ Container stopped and removed")
     else:
-        print("⚠ Container was not running or already stopped")
-
-    print()
-    print(f"[2/2] Removing container '{CONTAINER_NAME}'...")
-    result = run_command(["docker", "rm", CONTAINER_NAME], check=False, silent=True)
-    if result.returncode == 0:
-        print("✓ Container removed")
-    else:
-        print("⚠ Container was already removed")
+        print("⚠ Container was not running or already removed")
+    _container_running_cached.cache_clear()
 
     print()
     return 0
 
 
+def launch_vm(cfg, extra_args=()):
+    """Launch QEMU in the background with the client VM disk attached."""
+    # QEMU refuses to bind over a stale monitor socket from a killed VM
+    cfg.vm_monitor.unlink(missing_ok=True)
+    cfg.vm_ready_socket.unlink(missing_ok=True)
+
+    qemu_cmd = [
+        _which("qemu-system-x86_64") or "qemu-system-x86_64",
+        "-m", QEMU_MEMORY,
+        "-nographic",
+        "-drive", f"file={cfg.vm_test_image},format=qcow2",
+        # Attached as a CD-ROM so it is read-only and doesn't block savevm
+        "-drive", f"file={cfg.cidata_iso},format=raw,media=cdrom",
+        "-netdev", f"user,id=net0,hostfwd=tcp::{VM_SSH_PORT}-:22",
+        "-device", "virtio-net-pci,netdev=net0",
+        "-serial", "mon:stdio",
+        "-monitor", f"unix:{cfg.vm_monitor},server,nowait",
+        # Host end of the guest's "provisioning done" channel
+        "-chardev", f"socket,id=ready,path={cfg.vm_ready_socket},server=on,wait=off",
+        "-device", "virtio-serial",
+        "-device", f"virtserialport,chardev=ready,name={VM_READY_PORT}",
+        # Share the test scripts read-only so the guest runs them in place
+        "-virtfs", f"local,path={SCRIPT_DIR},mount_tag={SCRIPTS_MOUNT_TAG},security_model=none,readonly=on",
+        *extra_args
+    ]
+
+    # Start QEMU in background. All paths are absolute, so no cwd is needed,
+    # which (with close_fds off) keeps Popen on its posix_spawn fast path.
+    with open(cfg.vm_log, "w") as log_file:
+        return subprocess.Popen(
+            qemu_cmd,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+            close_fds=False
+        )
+
+
+def vm_ssh_command(remote_cmd):
+    """Build an ssh command line that runs remote_cmd as root in the VM."""
+    return [
+        "sshpass", "-p", VM_PASSWORD,
+        "ssh",
+        "-o", "StrictHostKeyChecking=no",
+        "-o", "UserKnownHostsFile=/dev/null",
+        # Reuse one authenticated connection across consecutive ssh calls
+        "-o", "ControlMaster=auto",
+        "-o", f"ControlPath={VM_SSH_CONTROL_PATH}",
+        "-o", "ControlPersist=60",
+        "-p", str(VM_SSH_PORT),
+        "root@localhost",
+        remote_cmd
+    ]
+
+
+def mount_scripts_command():
+    """Shell command that mounts the shared scripts directory in the VM."""
+    return (
+        f"mkdir -p {VM_SCRIPTS_DIR} && "
+        f"mount -t 9p -o trans=virtio,version=9p2000.L,ro {SCRIPTS_MOUNT_TAG} {VM_SCRIPTS_DIR}"
+    )
+
+
+def send_monitor_command(socket_path, command, timeout=60):
+    """Send a command to the QEMU human monitor and return its output."""
+    prompt = b"(qemu) "
+
+    def read_until_prompt(sock):
+        data = b""
+        while not data.endswith(prompt):
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("QEMU monitor closed the connection")
+            data += chunk
+        return data
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_path))
+        # Skip the greeting banner
+        read_until_prompt(sock)
+        sock.sendall(command.encode() + b"\n")
+        output = read_until_prompt(sock)
+
+    return output[:-len(prompt)].decode(errors="replace")
+
+
+def vm_snapshot_stamp(cfg):
+    """Identify the base image and cidata a snapshot was taken from (size and mtime)."""
+    parts = []
+    for path in (cfg.vm_image, cfg.cidata_iso):
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        parts.append(f"{path.name} {st.st_size} {st.st_mtime_ns}")
+    return "\n".join(parts) + "\n"
+
+
+def has_vm_snapshot(cfg):
+    """Check if the test image has a provisioned snapshot to resume from."""
+    if not cfg.vm_test_image.exists() or not _have("qemu-img"):
+        return False
+    result = run_command(
+        ["qemu-img", "snapshot", "-l", str(cfg.vm_test_image)],
+        check=False,
+        silent=True,
+        capture=True
+    )
+    if result.returncode != 0:
+        return False
+    if not any(VM_SNAPSHOT_NAME in line.split() for line in result.stdout.splitlines()):
+        return False
+
+    # A snapshot taken before the base image or cidata was rebuilt would
+    # resume the old guest, so it is dropped and the VM boots fresh
+    try:
+        saved = cfg.vm_snapshot_stamp.read_text()
+    except OSError:
+        saved = None
+    current = vm_snapshot_stamp(cfg)
+    if current is not None and saved == current:
+        return True
+    print(f"⚠ Snapshot '{VM_SNAPSHOT_NAME}' is stale (base image or cidata changed) - deleting it")
+    run_command(
+        ["qemu-img", "snapshot", "-d", VM_SNAPSHOT_NAME, str(cfg.vm_test_image)],
+        check=False,
+        silent=True
+    )
+    cfg.vm_snapshot_stamp.unlink(missing_ok=True)
+    return False
+
+
+def resume_client(cfg):
+    """Try to resume the client VM from its provisioned snapshot."""
+    process = launch_vm(cfg, ["-loadvm", VM_SNAPSHOT_NAME])
+
+    # The monitor only answers once the snapshot is loaded; if loading
+    # fails QEMU exits and the connection is refused or dropped
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline and process.poll() is None:
+        try:
+            status = send_monitor_command(cfg.vm_monitor, "info status", timeout=60)
+            if "running" in status:
+                print(f"✓ VM resumed in background (PID: {process.pid})")
+                return True
+            break
+        except OSError as e:
+            log.debug(f"  Monitor not ready yet ({e}), retrying...")
+            time.sleep(0.25)
+
+    if process.poll() is None:
+        process.terminate()
+        process.wait()
+    return False
+
+
 def start_client(cfg):
     """Start Alpine VM for NFS client testing (assumes VM image is already built)."""
     print("=" * 60)
@@ -201,14 +592,37 @@ def start_client(cfg):
         print()
         return 0
 
-    # Copy base image to test image
+    # A snapshot saved by warm-client skips the boot and cloud-init entirely
+    if has_vm_snapshot(cfg):
+        print()
+        print(f"Resuming VM from snapshot '{VM_SNAPSHOT_NAME}'...")
+        if resume_client(cfg):
+            print()
+            return 0
+        print("⚠ Snapshot resume failed - falling back to a fresh boot")
+
+    # Create a copy-on-write overlay backed by the base image, so the base
+    # stays pristine without copying the whole disk on every start
     print()
     print("[2/4] Preparing VM image...")
-    print(f"  Source: {cfg.vm_image}")
-    print(f"  Destination: {cfg.vm_test_image}")
+    print(f"  Backing image: {cfg.vm_image}")
+    print(f"  Overlay: {cfg.vm_test_image}")
     cfg.vm_dir.mkdir(parents=True, exist_ok=True)
-    shutil.copy(cfg.vm_image, cfg.vm_test_image)
-    print("✓ VM image copied")
+    if _have("qemu-img"):
+        run_command([
+            "qemu-img", "create",
+            "-f", "qcow2",
+            "-F", "qcow2",
+            "-b", str(cfg.vm_image),
+            str(cfg.vm_test_image)
+        ], silent=True)
+        print("✓ VM overlay image created")
+    else:
+        # copyfile (unlike copy) skips the chmod and lets CPython use the
+        # kernel's zero-copy fast path (copy_file_range/sendfile) on Linux
+        print("  qemu-img not found, falling back to a full copy")
+        shutil.copyfile(cfg.vm_image, cfg.vm_test_image)
+        print("✓ VM image copied")
 
     # Start VM in background
     print()
@@ -217,61 +631,36 @@ def start_client(cfg):
     print(f"  SSH port: {VM_SSH_PORT}")
     print(f"  Log file: {cfg.vm_log}")
 
-    qemu_cmd = [
-        "qemu-system-x86_64",
-        "-m", QEMU_MEMORY,
-        "-nographic",
-        "-drive", f"file={cfg.vm_test_image},format=qcow2",
-        "-drive", f"file={cfg.cidata_iso},format=raw",
-        "-netdev", f"user,id=net0,hostfwd=tcp::{VM_SSH_PORT}-:22",
-        "-device", "virtio-net-pci,netdev=net0",
-        "-serial", "mon:stdio"
-    ]
-
-    # Start QEMU in background
-    with open(cfg.vm_log, "w") as log_file:
-        process = subprocess.Popen(
-            qemu_cmd,
-            stdout=log_file,
-            stderr=subprocess.STDOUT,
-            cwd=PROJECT_ROOT
-        )
+    process = launch_vm(cfg)
 
     print(f"✓ VM started in background (PID: {process.pid})")
     print(f"  Monitor logs with: tail -f {cfg.vm_log}")
 
-    # Wait for cloud-init to complete by monitoring the VM log
+    # Wait for cloud-init to complete. The final runcmd step writes a marker
+    # to a virtio-serial port wired to a host socket, so we block on that
+    # instead of polling; the same marker is echoed to the serial console
+    # (vm.log), which is the fallback if the channel can't be opened.
     print()
     print(f"[4/4] Waiting for cloud-init to complete...")
-    print("  Monitoring VM console output for completion marker...")
-
-    max_wait_time = 300  # 5 minutes
-    start_time = time.time()
-    cloud_init_done = False
 
     # Custom marker from user-data that signals provisioning is complete
-    # This is echoed to console in the final runcmd step, which appears in QEMU serial output (vm.log)
     COMPLETION_MARKER = "NFSTEST_VM_READY"
+    max_wait_time = 300  # 5 minutes
+    deadline = time.monotonic() + max_wait_time
 
-    while time.time() - start_time < max_wait_time:
-        if cfg.vm_log.exists():
-            try:
-                with open(cfg.vm_log, 'r') as f:
-                    log_content = f.read()
-
-                    # Check for our custom completion marker
-                    if COMPLETION_MARKER in log_content:
-                        cloud_init_done = True
-                        print(f"✓ cloud-init completed successfully")
-                        break
-            except Exception:
-                # Log file might be being written to, ignore and retry
-                pass
+    try:
+        print("  Waiting for ready signal on the virtio-serial channel...")
+        cloud_init_done = wait_for_ready_channel(cfg.vm_ready_socket, COMPLETION_MARKER, deadline)
+    except OSError as e:
+        print(f"  Ready channel unavailable ({e}), monitoring VM console output instead...")
+        remaining = max(deadline - time.monotonic(), 0)
+        cloud_init_done = wait_for_log_marker(cfg.vm_log, COMPLETION_MARKER, timeout=remaining)
 
-        time.sleep(2)
+    if cloud_init_done:
+        print(f"✓ cloud-init completed successfully")
 
     if not cloud_init_done:
-        print("⚠ WARNING: cloud-init completion marker not found in logs within timeout")
+        print("⚠ WARNING: cloud-init completion marker not received within timeout")
         print("  Checking if SSH is available as fallback...")
         if wait_for_port("localhost", VM_SSH_PORT, description="VM SSH", timeout=30):
             print("✓ SSH is available, proceeding")
@@ -292,7 +681,11 @@ def stop_client():
     print()
 
     print("Stopping QEMU process...")
-    result = run_command(["pkill", "-f", "qemu-system-x86_64.*vm-test.qcow2"], check=False, silent=True)
+    result = subprocess.run(
+        ["pkill", "-f", "qemu-system-x86_64.*vm-test.qcow2"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
     if result.returncode == 0:
         print("✓ VM stopped")
     else:
@@ -302,6 +695,45 @@ def stop_client():
     return 0
 
 
+def warm_client(cfg):
+    """Snapshot the running, provisioned client VM for fast restarts."""
+    print("=" * 60)
+    print("Saving NFS Client VM Snapshot")
+    print("=" * 60)
+    print()
+
+    if not is_vm_running():
+        print("✗ ERROR: Client VM is not running. Run 'start-client' first.", file=sys.stderr)
+        return 1
+
+    # QEMU blocks savevm while a 9p share is mounted in the guest
+    print(f"Unmounting {VM_SCRIPTS_DIR} in the VM...")
+    if _have("sshpass"):
+        run_command(vm_ssh_command(f"umount {VM_SCRIPTS_DIR}"), check=False, silent=True)
+    else:
+        print("⚠ sshpass not installed - savevm may be blocked by the mounted share")
+
+    print(f"Saving snapshot '{VM_SNAPSHOT_NAME}' to {cfg.vm_test_image}...")
+    try:
+        output = send_monitor_command(cfg.vm_monitor, f"savevm {VM_SNAPSHOT_NAME}", timeout=300)
+    except OSError as e:
+        print(f"✗ ERROR: Could not reach QEMU monitor at {cfg.vm_monitor}: {e}", file=sys.stderr)
+        return 1
+
+    if "Error" in output:
+        print(f"✗ ERROR: savevm failed: {output.strip()}", file=sys.stderr)
+        return 1
+
+    # Tie the snapshot to the images it was provisioned from
+    stamp = vm_snapshot_stamp(cfg)
+    if stamp is not None:
+        cfg.vm_snapshot_stamp.write_text(stamp)
+
+    print("✓ Snapshot saved - the next start-client will resume from it")
+    print()
+    return 0
+
+
 def run_tests(cfg, testcase="open,read,write"):
     """Run NFS integration tests."""
     print("=" * 60)
@@ -311,14 +743,14 @@ def run_tests(cfg, testcase="open,read,write"):
 
     # Check sshpass
     print("[Preflight] Checking dependencies...")
-    if not shutil.which("sshpass"):
+    if not _have("sshpass"):
         print("✗ ERROR: sshpass not installed. Install with: brew install sshpass", file=sys.stderr)
         return 1
     print("✓ sshpass is available")
 
     # Check if NFS server container is running
     print()
-    print("[Step 1/4] Verifying NFS server is running...")
+    print("[Step 1/3] Verifying NFS server is running...")
     if not is_container_running(CONTAINER_NAME):
         print("✗ ERROR: NFS server container is not running. Run 'make start-server' first.", file=sys.stderr)
         return 1
@@ -326,7 +758,7 @@ def run_tests(cfg, testcase="open,read,write"):
 
     # Wait for NFS server to be ready
     print()
-    print("[Step 2/4] Waiting for NFS server to be ready...")
+    print("[Step 2/3] Waiting for NFS server to be ready...")
     if not wait_for_port("localhost", NFS_PORT, description="NFS server"):
         # Show container logs on failure
         print()
@@ -336,44 +768,25 @@ def run_tests(cfg, testcase="open,read,write"):
 
     # Check if VM is running
     print()
-    print("[Step 3/4] Verifying client VM is running...")
+    print("[Step 3/3] Verifying client VM is running...")
     if not is_vm_running():
         print("✗ ERROR: Client VM is not running. Run 'make start-client' first.", file=sys.stderr)
         return 1
     print("✓ Using existing client VM (cloud-init already completed)")
 
-    # Copy runner script to VM
-    print()
-    print("[Step 4/4] Copying test script to VM...")
-    print(f"  Source: {RUNNER_SCRIPT}")
-    print(f"  Destination: root@localhost:/tmp/runner.py")
-    scp_cmd = [
-        "sshpass", "-p", VM_PASSWORD,
-        "scp",
-        "-o", "StrictHostKeyChecking=no",
-        "-o", "UserKnownHostsFile=/dev/null",
-        "-P", str(VM_SSH_PORT),
-        str(RUNNER_SCRIPT),
-        "root@localhost:/tmp/runner.py"
-    ]
-    run_command(scp_cmd)
-    print("✓ Test script copied successfully")
-
     # Run tests
     print()
     print("=" * 60)
     print("Running tests in VM...")
     print("=" * 60)
     print()
-    ssh_cmd = [
-        "sshpass", "-p", VM_PASSWORD,
-        "ssh",
-        "-o", "StrictHostKeyChecking=no",
-        "-o", "UserKnownHostsFile=/dev/null",
-        "-p", str(VM_SSH_PORT),
-        "root@localhost",
-        f"python3 /tmp/runner.py --testcase {testcase}"
-    ]
+    print(f"  Runner: {RUNNER_SCRIPT} (shared into the VM at {VM_SCRIPTS_DIR})")
+    # The share is mounted at provisioning time, but not after resuming from
+    # a snapshot (warm-client unmounts it so savevm isn't blocked)
+    ssh_cmd = vm_ssh_command(
+        f"{{ mountpoint -q {VM_SCRIPTS_DIR} || {mount_scripts_command()}; }} && "
+        f"python3 {VM_SCRIPTS_DIR}/{RUNNER_SCRIPT.name} --testcase {testcase}"
+    )
     # Run the test script - stream output directly to terminal in real-time
     result = run_command(ssh_cmd, check=False, stream=True)
 
@@ -395,6 +808,11 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
 
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="Show debug output")
+    verbosity.add_argument("-q", "--quiet", action="store_true",
+                           help="Hide command echoes and polling progress")
+
     subparsers = parser.add_subparsers(dest="command", help="Command to run")
 
     # Create a parent parser for common arguments
@@ -413,6 +831,8 @@ def main():
     # Client commands
     subparsers.add_parser("start-client", parents=[parent_parser], help="Start Alpine VM for NFS client testing")
     subparsers.add_parser("stop-client", help="Stop client VM")
+    subparsers.add_parser("warm-client", parents=[parent_parser],
+                          help="Snapshot the provisioned client VM so later starts skip the boot")
 
     # Environment commands
     subparsers.add_parser("start-env", parents=[parent_parser], help="Start both server and client VM")
@@ -424,6 +844,14 @@ def main():
 
     args = parser.parse_args()
 
+    if args.verbose:
+        log_level = logging.DEBUG
+    elif args.quiet:
+        log_level = logging.WARNING
+    else:
+        log_level = logging.INFO
+    logging.basicConfig(stream=sys.stdout, format="%(message)s", level=log_level)
+
     if not args.command:
         parser.print_help()
         return 1
@@ -447,11 +875,20 @@ def main():
         return start_client(cfg)
     elif args.command == "stop-client":
         return stop_client()
+    elif args.command == "warm-client":
+        return warm_client(cfg)
     elif args.command == "start-env":
-        ret = start_server(cfg)
-        if ret != 0:
-            return ret
-        return start_client(cfg)
+        # The server container and the client VM are independent until tests
+        # run, so overlap the container start with the (much longer) VM boot.
+        # The VM boot reports progress live from this thread; the server's
+        # output is held back and printed as one block afterwards, so the two
+        # don't interleave.
+        with _ThreadOutput() as output, ThreadPoolExecutor(max_workers=1) as executor:
+            server = executor.submit(output.buffered, start_server, cfg)
+            client_ret = start_client(cfg)
+            server_ret, server_output = server.result()
+        sys.stdout.write(server_output)
+        return server_ret or client_ret
     elif args.command == "stop-env":
         stop_server()
         stop_client()
@@ -21,12 +21,9 @@ NFSTEST_DIR = "/opt/nfstest"
 def check_port(host, port, timeout=1):
     """Check if a port is reachable."""
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        result = sock.connect_ex((host, port))
-        sock.close()
-        return result == 0
-    except Exception:
+        socket.create_connection((host, port), timeout=timeout).close()
+        return True
+    except OSError:
         return False
 
 
@@ -37,6 +37,12 @@ impl RpcServer {
             let (socket, peer_addr) = listener.accept().await?;
             info!("New connection from {}", peer_addr);
 
+            // RPC is small request/response traffic; don't let Nagle hold
+            // replies back waiting for the client's ACK
+            if let Err(e) = socket.set_nodelay(true) {
+                warn!("Failed to set TCP_NODELAY for {}: {}", peer_addr, e);
+            }
+
             let registry = self.registry.clone();
             let filesystem = self.filesystem.clone();
             tokio::spawn(async move {
@@ -0,0 +1,304 @@
+"""
+Shared RPC/XDR helpers for the NFS integration tests
+
+The test scripts are run directly (python3 tests/test_*.py), which puts this
+directory on sys.path, so they import these helpers as `from _nfs_rpc import ...`.
+"""
+
+import socket
+import struct
+
+# Precompiled XDR layouts
+_U32 = struct.Struct('>I')          # XDR unsigned int / record marking header
+_U64 = struct.Struct('>Q')          # XDR unsigned hyper
+_RPC_HDR = struct.Struct('>10I')    # xid, msg_type, rpcvers, prog, vers, proc, cred, verf
+_RPC_REPLY_HDR = struct.Struct('>6I')    # xid, msg_type, reply_stat, verf, accept_stat
+_REPLY_STATUS = struct.Struct('>8xI8xI')  # reply_stat, accept_stat (skips xid, msg_type, verf)
+# fattr3 (84 bytes): type, mode, nlink, uid, gid, size, used, rdev, fsid,
+# fileid, atime, mtime, ctime
+_FATTR3 = struct.Struct('>IIIIIQQQQQQQQ')
+_WCC_ATTR = struct.Struct('>QIIII')       # wcc_attr: size, mtime, ctime
+
+# Zero padding to the next 4-byte XDR boundary, indexed by (length & 3)
+_PAD = (b'', b'\x00\x00\x00', b'\x00\x00', b'\x00')
+
+# Reply header words after the XID for the common case: msg_type = REPLY (1),
+# MSG_ACCEPTED, AUTH_NONE verifier of length 0, accept_stat = SUCCESS
+_REPLY_OK = struct.pack('>5I', 1, 0, 0, 0, 0)
+
+# struct timeval {tv_sec = 5, tv_usec = 0} for SO_RCVTIMEO/SO_SNDTIMEO
+_IO_TIMEOUT = struct.pack('ll', 5, 0)
+
+# struct linger {l_onoff = 1, l_linger = 0}: close() sends RST, no TIME_WAIT
+_LINGER_ABORT = struct.pack('ii', 1, 0)
+
+# Ask the kernel to hold recv until the full request is there; absent on
+# some platforms, where 0 leaves the plain recv loop below to do the work
+_MSG_WAITALL = getattr(socket, 'MSG_WAITALL', 0)
+
+# createhow3 for an UNCHECKED create with mode 0644 (fully static, so packed once)
+#
+# sattr3 structure (UNION format - only sends discriminator + value when set):
+# CRITICAL: This is a XDR union, NOT a struct!
+# - If discriminator = 0 (DONT_SET), only send 4 bytes (discriminator only)
+# - If discriminator = 1 (SET), send 4 bytes (discriminator) + value
+_CREATEHOW_UNCHECKED_0644 = struct.pack(
+    '>8I',
+    0,          # createmode3 = UNCHECKED
+    1, 0o644,   # set_mode3: SET_MODE + mode 0644 (value only sent because discriminator=1)
+    0,          # set_uid3: DONT_SET_UID (only 4 bytes!)
+    0,          # set_gid3: DONT_SET_GID (only 4 bytes!)
+    0,          # set_size3: DONT_SET_SIZE (only 4 bytes!)
+    0,          # set_atime: DONT_CHANGE (only 4 bytes!)
+    0           # set_mtime: DONT_CHANGE (only 4 bytes!)
+)
+
+# MNT3args for "/" (XDR string: length 1 + '/' + 3 bytes padding)
+_MOUNT_ROOT_ARGS = b'\x00\x00\x00\x01/\x00\x00\x00'
+
+
+def pack_string(s):
+    """Pack a string as XDR string"""
+    data = s.encode('utf-8')
+    length = len(data)
+    return _U32.pack(length) + data + _PAD[length & 3]
+
+
+def pack_opaque(data):
+    """Pack variable-length opaque data, e.g. a file handle (length + data + padding)"""
+    length = len(data)
+    return _U32.pack(length) + data + _PAD[length & 3]
+
+
+def unpack_opaque_flex(data, offset):
+    """Unpack variable-length opaque data (length + data)"""
+    length = _U32.unpack_from(data, offset)[0]
+    start = offset + 4
+    # Data is padded to a 4-byte boundary
+    return data[start:start+length], start + ((length + 3) & ~3)
+
+
+def _connect(host, port, rcvbuf=None):
+    """
+    Open a Nagle-free connection to the server with a 5s timeout
+
+    Every test makes all its calls over the one socket returned here.
+    rcvbuf, if given, sizes SO_RCVBUF before connecting so the advertised
+    window can cover the test's largest reply. The returned socket is in
+    blocking mode (the timeout is enforced by the kernel), which MSG_WAITALL
+    in recv_exact needs.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    # Send the small call immediately instead of waiting on Nagle
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if rcvbuf is not None:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        except OSError:
+            # Some platforms clamp or refuse; the default still works
+            pass
+    sock.settimeout(5.0)
+    sock.connect((host, port))
+    # Back to a plain blocking socket: with a Python-level timeout the fd is
+    # O_NONBLOCK, so recv never waits and MSG_WAITALL is ignored. The kernel
+    # enforces the same 5s limit on the transfers instead.
+    sock.settimeout(None)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, _IO_TIMEOUT)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, _IO_TIMEOUT)
+    # Every reply has been read by the time a test closes the connection, so
+    # reset it instead of leaving a TIME_WAIT entry behind on each run
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, _LINGER_ABORT)
+    return sock
+
+
+def recv_exact(sock, nbytes):
+    """
+    Receive nbytes from a plain socket
+
+    Returns: the bytes read (shorter than nbytes if the peer closed early)
+    """
+    # Normally a single MSG_WAITALL recv on the blocking socket; the loop
+    # covers short returns (signals, SO_RCVTIMEO expiry mid-reply, peer close)
+    chunks = []
+    remaining = nbytes
+    while remaining:
+        try:
+            chunk = sock.recv(remaining, _MSG_WAITALL)
+        except BlockingIOError:
+            # SO_RCVTIMEO expired with nothing received
+            raise socket.timeout("Timed out waiting for response") from None
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    # Skip the join (and its copy) in the usual single-recv case
+    return chunks[0] if len(chunks) == 1 else b''.join(chunks)
+
+
+def pack_call(xid, prog, vers, proc, args_data):
+    """Build a record-marked RPC call ready to be written to the stream"""
+    # Lay out record marking + call header + arguments in one buffer
+    msg_len = _RPC_HDR.size + len(args_data)
+    record = bytearray(4 + msg_len)
+
+    # Add RPC record marking
+    _U32.pack_into(record, 0, 0x80000000 | msg_len)
+
+    # Build RPC call header
+    _RPC_HDR.pack_into(
+        record, 4,
+        xid,        # XID
+        0,          # msg_type = CALL (0)
+        2,          # RPC version
+        prog,       # Program
+        vers,       # Version
+        proc,       # Procedure
+        0, 0,       # cred (AUTH_NONE, length 0)
+        0, 0        # verf (AUTH_NONE, length 0)
+    )
+
+    # Add procedure arguments
+    record[4 + _RPC_HDR.size:] = args_data
+    return record
+
+
+def recv_reply(sock):
+    """Read the next RPC reply record from the connection"""
+    # Receive response
+    reply_header_bytes = recv_exact(sock, 4)
+    if len(reply_header_bytes) != 4:
+        raise Exception("Failed to read response header")
+    reply_len = _U32.unpack_from(reply_header_bytes)[0] & 0x7FFFFFFF
+
+    # Read response data
+    return recv_exact(sock, reply_len)
+
+
+def wait_reply(sock, xid, pending):
+    """Return the reply for xid, holding replies to other queued calls in pending"""
+    while xid not in pending:
+        reply_data = recv_reply(sock)
+        if len(reply_data) < 4:
+            # Too short to carry an XID; let parse_rpc_reply report it
+            return reply_data
+        pending[_U32.unpack_from(reply_data)[0]] = reply_data
+    return pending.pop(xid)
+
+
+def rpc_call(sock, xid, prog, vers, proc, args_data):
+    """Make an RPC call on an open connection and return the response"""
+    sock.sendall(pack_call(xid, prog, vers, proc, args_data))
+    return wait_reply(sock, xid, {})
+
+
+def parse_rpc_reply(reply_data):
+    """Parse RPC reply header, return offset to result data"""
+    if len(reply_data) < 24:
+        raise Exception(f"Response too short: {len(reply_data)} bytes")
+
+    # Fast path: an accepted, successful reply with an AUTH_NONE verifier
+    # (compared by slice so memoryviews, which lack startswith, work too)
+    if reply_data[4:24] == _REPLY_OK:
+        return 24
+
+    reply_stat, accept_stat = _REPLY_STATUS.unpack_from(reply_data, 0)
+
+    if reply_stat != 0 or accept_stat != 0:
+        raise Exception(f"RPC error: reply_stat={reply_stat}, accept_stat={accept_stat}")
+
+    return 24  # Return offset to procedure-specific data
+
+
+def parse_post_op_attr(reply_data, offset):
+    """
+    Parse post_op_attr (RFC 1813)
+
+    post_op_attr = bool + optional fattr3 (84 bytes if present)
+
+    Returns: (attr_dict or None, next_offset)
+    """
+    attr_follows = _U32.unpack_from(reply_data, offset)[0]
+    offset += 4
+
+    attr = None
+    if attr_follows:
+        # fattr3 = 84 bytes
+        (ftype, mode, nlink, uid, gid, size, used, rdev, fsid,
+         fileid, atime, mtime, ctime) = _FATTR3.unpack_from(reply_data, offset)
+        offset += 84
+
+        attr = {
+            'type': ftype,
+            'mode': mode,
+            'nlink': nlink,
+            'uid': uid,
+            'gid': gid,
+            'size': size
+        }
+
+    return attr, offset
+
+
+def parse_wcc_data(reply_data, offset):
+    """
+    Parse wcc_data structure (RFC 1813)
+
+    wcc_data = {
+        pre_op_attr:  bool + optional wcc_attr (24 bytes if present)
+        post_op_attr: bool + optional fattr3 (84 bytes if present)
+    }
+
+    Returns: (pre_attr_dict, post_attr_dict, next_offset)
+    """
+    start_offset = offset
+
+    # 1. Parse pre_op_attr
+    pre_attr_follows = _U32.unpack_from(reply_data, offset)[0]
+    offset += 4
+
+    pre_attr = None
+    if pre_attr_follows:
+        # wcc_attr = size(8) + mtime(8) + ctime(8) = 24 bytes
+        size, mtime_sec, mtime_nsec, ctime_sec, ctime_nsec = _WCC_ATTR.unpack_from(reply_data, offset)
+        offset += 24
+        pre_attr = {
+            'size': size,
+            'mtime': (mtime_sec, mtime_nsec),
+            'ctime': (ctime_sec, ctime_nsec)
+        }
+
+    # 2. Parse post_op_attr
+    post_attr, offset = parse_post_op_attr(reply_data, offset)
+
+    # Validate total wcc_data size
+    expected_size = 4 + (24 if pre_attr_follows else 0) + 4 + (84 if post_attr else 0)
+    actual_size = offset - start_offset
+    if actual_size != expected_size:
+        raise Exception(f"wcc_data size mismatch: expected {expected_size}, got {actual_size}")
+
+    return pre_attr, post_attr, offset
+
+
+def skip_wcc_data(reply_data, offset):
+    """
+    Step over a wcc_data structure without decoding it
+
+    For callers that only check the reply layout (and loops that parse many
+    replies): reads just the two attributes_follow flags.
+
+    Returns: next_offset
+    """
+    # 1. Skip pre_op_attr
+    if _U32.unpack_from(reply_data, offset)[0]:
+        offset += 24    # wcc_attr = size(8) + mtime(8) + ctime(8)
+    offset += 4
+
+    # 2. Skip post_op_attr
+    if _U32.unpack_from(reply_data, offset)[0]:
+        offset += 84    # fattr3
+    offset += 4
+
+    if offset > len(reply_data):
+        raise Exception(f"wcc_data runs past the end of the reply: offset {offset}, length {len(reply_data)}")
+
+    return offset
@@ -11,32 +11,20 @@ This test validates:
 """
 
 import socket
-import struct
 import sys
 
+from _nfs_rpc import (
+    _RPC_REPLY_HDR,
+    _U32,
+    _connect,
+    pack_call,
+    pack_string,
+    recv_reply,
+    unpack_opaque_flex,
+)
 
-def pack_xdr_string(s):
-    """Pack a string in XDR format"""
-    # XDR string format:
-    # - Length (4 bytes, big-endian)
-    # - Data (variable length)
-    # - Padding to 4-byte boundary with zeros
-    encoded = s.encode('utf-8')
-    length = len(encoded)
-    padding = (4 - (length % 4)) % 4
-    return struct.pack('>I', length) + encoded + (b'\x00' * padding)
-
-
-def unpack_xdr_opaque_flex(data, offset):
-    """Unpack XDR variable-length opaque data (length + bytes)"""
-    length = struct.unpack('>I', data[offset:offset+4])[0]
-    offset += 4
-    value = data[offset:offset+length]
-    offset += length
-    # Skip padding to 4-byte boundary
-    padding = (4 - (length % 4)) % 4
-    offset += padding
-    return value, offset
+# Not exported by the socket module; Linux value from <asm-generic/socket.h>
+SO_BUSY_POLL = getattr(socket, 'SO_BUSY_POLL', 46)
 
 
 def test_mount_mnt():
@@ -60,89 +48,55 @@ def test_mount_mnt():
     print(f"  Path: '{mount_path}'")
     print()
 
-    # Build RPC call header
-    rpc_header = struct.pack(
-        '>IIIII II II',
-        xid,        # XID
-        2,          # RPC version
-        100005,     # Program (MOUNT)
-        3,          # Version (MOUNTv3)
-        1,          # Procedure (MNT)
-        0, 0,       # cred (AUTH_NONE, length 0)
-        0, 0        # verf (AUTH_NONE, length 0)
-    )
-
     # Pack directory path as XDR string
-    path_data = pack_xdr_string(mount_path)
-
-    # Complete call message
-    call_msg = rpc_header + path_data
+    path_data = pack_string(mount_path)
 
-    # Add RPC record marking header
-    msg_len = len(call_msg)
-    record_header = struct.pack('>I', 0x80000000 | msg_len)
+    # Record-marked call: 40-byte call header (AUTH_NONE) + path
+    record = pack_call(xid, 100005, 3, 1, path_data)  # MOUNT v3, MNT (proc 1)
+    msg_len = len(record) - 4
 
     print(f"Request:")
-    print(f"  RPC header: {len(rpc_header)} bytes")
+    print(f"  RPC header: {msg_len - len(path_data)} bytes")
     print(f"  Path data: {len(path_data)} bytes")
     print(f"  Total message: {msg_len} bytes")
-    print(f"  Record marking: 0x{struct.unpack('>I', record_header)[0]:08x}")
-    print(f"  Message (hex): {call_msg.hex()}")
+    print(f"  Record marking: 0x{_U32.unpack_from(record)[0]:08x}")
+    print(f"  Message (hex): {record[4:].hex()}")
     print()
 
     # Connect and send
     try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(5.0)
-        sock.connect((host, port))
-
-        sock.sendall(record_header + call_msg)
-        print("✓ Request sent")
-        print()
-
-        # Receive response
-        print("Waiting for response...")
-
-        # Read record marking header (4 bytes)
-        reply_header_bytes = sock.recv(4)
-        if len(reply_header_bytes) != 4:
-            print(f"✗ Failed to read response header (got {len(reply_header_bytes)} bytes)")
-            sys.exit(1)
-
-        reply_header = struct.unpack('>I', reply_header_bytes)[0]
-        is_last = (reply_header & 0x80000000) != 0
-        reply_len = reply_header & 0x7FFFFFFF
-
-        print(f"Response fragment: last={is_last}, length={reply_len}")
-
-        # Read response data
-        reply_data = b''
-        while len(reply_data) < reply_len:
-            chunk = sock.recv(reply_len - len(reply_data))
-            if not chunk:
-                break
-            reply_data += chunk
-
-        sock.close()
+        with _connect(host, port) as sock:
+            # Busy-poll the receive queue for up to 50us (Linux only, and may
+            # need CAP_NET_ADMIN) to shave wakeup latency off the reply
+            if sys.platform.startswith('linux'):
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, 50)
+                except OSError:
+                    pass
+
+            sock.sendall(record)
+            print("✓ Request sent")
+            print()
 
-        if len(reply_data) != reply_len:
-            print(f"✗ Incomplete response: expected {reply_len}, got {len(reply_data)} bytes")
-            sys.exit(1)
+            # Receive response
+            print("Waiting for response...")
+            reply_data = recv_reply(sock)
 
         print(f"Response ({len(reply_data)} bytes, hex): {reply_data.hex()}")
         print()
 
-        # Parse RPC reply header (20 bytes)
-        if len(reply_data) < 20:
-            print(f"✗ Response too short: {len(reply_data)} bytes (expected at least 20)")
+        # Parse RPC reply header (24 bytes)
+        if len(reply_data) < _RPC_REPLY_HDR.size:
+            print(f"✗ Response too short: {len(reply_data)} bytes (expected at least {_RPC_REPLY_HDR.size})")
             sys.exit(1)
 
-        reply_xid, reply_stat, verf_flavor, verf_len, accept_stat = struct.unpack(
-            '>IIIII', reply_data[:20]
+        reply_xid, msg_type, reply_stat, verf_flavor, verf_len, accept_stat = (
+            _RPC_REPLY_HDR.unpack_from(reply_data)
         )
 
         print("RPC Reply Header:")
         print(f"  XID: {reply_xid} (expected {xid})")
+        print(f"  Message type: {msg_type} (1=REPLY)")
         print(f"  Reply stat: {reply_stat} (0=MSG_ACCEPTED)")
         print(f"  Verf flavor: {verf_flavor} (0=AUTH_NONE)")
         print(f"  Verf length: {verf_len}")
@@ -153,6 +107,9 @@ def test_mount_mnt():
         if reply_xid != xid:
             print(f"✗ XID mismatch: expected {xid}, got {reply_xid}")
             sys.exit(1)
+        if msg_type != 1:
+            print(f"✗ Message type should be 1 (REPLY), got {msg_type}")
+            sys.exit(1)
         if reply_stat != 0:
             print(f"✗ Reply stat should be 0 (MSG_ACCEPTED), got {reply_stat}")
             sys.exit(1)
@@ -166,14 +123,14 @@ def test_mount_mnt():
         #   if status == MNT3_OK (0):
         #     fhandle3 (variable length opaque)
         #     auth_flavors (variable length array of int)
-        offset = 20
+        offset = _RPC_REPLY_HDR.size
 
         if offset >= len(reply_data):
             print("✗ No MOUNT data after RPC header")
             sys.exit(1)
 
         # Parse mountstat3 (discriminant)
-        mount_status = struct.unpack('>I', reply_data[offset:offset+4])[0]
+        mount_status = _U32.unpack_from(reply_data, offset)[0]
         offset += 4
 
         print("MOUNT Response:")
@@ -181,20 +138,20 @@ def test_mount_mnt():
 
         if mount_status == 0:  # MNT3_OK
             # Parse file handle (opaque<>)
-            fhandle, offset = unpack_xdr_opaque_flex(reply_data, offset)
+            fhandle, offset = unpack_opaque_flex(reply_data, offset)
             print(f"  File handle: {len(fhandle)} bytes")
             print(f"  File handle (hex): {fhandle.hex()}")
 
             # Parse auth_flavors array (int<>)
             if offset < len(reply_data):
-                num_flavors = struct.unpack('>I', reply_data[offset:offset+4])[0]
+                num_flavors = _U32.unpack_from(reply_data, offset)[0]
                 offset += 4
                 print(f"  Auth flavors: {num_flavors} entries")
 
                 flavors = []
                 for i in range(num_flavors):
                     if offset + 4 <= len(reply_data):
-                        flavor = struct.unpack('>I', reply_data[offset:offset+4])[0]
+                        flavor = _U32.unpack_from(reply_data, offset)[0]
                         flavors.append(flavor)
                         offset += 4
 
@@ -10,9 +10,27 @@ This test validates:
 """
 
 import socket
-import struct
 import sys
 
+from _nfs_rpc import _RPC_HDR, _RPC_REPLY_HDR, _U32, _connect, recv_reply
+
+_NULL_XID = 99999  # Transaction ID
+
+# The NFS NULL call never changes, so the whole record is packed once at import
+_NULL_CALL = _RPC_HDR.pack(
+    _NULL_XID,  # XID
+    0,          # msg_type = CALL (0)
+    2,          # RPC version
+    100003,     # Program (NFS)
+    3,          # Version (NFSv3)
+    0,          # Procedure (NULL)
+    0, 0,       # cred (AUTH_NONE, length 0)
+    0, 0        # verf (AUTH_NONE, length 0)
+)
+
+# NULL procedure has no arguments; prepend the RPC record marking
+_NULL_RECORD = _U32.pack(0x80000000 | len(_NULL_CALL)) + _NULL_CALL
+
 
 def test_nfs_null():
     """Test NFS NULL procedure"""
@@ -24,7 +42,7 @@ def test_nfs_null():
     # Server connection details
     host = "localhost"
     port = 4000
-    xid = 99999
+    xid = _NULL_XID
 
     print(f"Connecting to {host}:{port}")
     print(f"  Program: 100003 (NFS)")
@@ -33,69 +51,26 @@ def test_nfs_null():
     print()
 
     try:
-        # Build RPC call header for NFS NULL (same format as other RPC tests)
-        message = b''
-        message += struct.pack('>I', xid)      # XID
-        message += struct.pack('>I', 0)        # msg_type = CALL (0)
-        message += struct.pack('>I', 2)        # RPC version
-        message += struct.pack('>I', 100003)   # Program (NFS)
-        message += struct.pack('>I', 3)        # Version (NFSv3)
-        message += struct.pack('>I', 0)        # Procedure (NULL)
-        # cred (AUTH_NONE)
-        message += struct.pack('>I', 0)        # flavor = AUTH_NONE
-        message += struct.pack('>I', 0)        # length = 0
-        # verf (AUTH_NONE)
-        message += struct.pack('>I', 0)        # flavor = AUTH_NONE
-        message += struct.pack('>I', 0)        # length = 0
-
-        # NULL procedure has no arguments
-        call_msg = message
-
-        # Add RPC record marking
-        msg_len = len(call_msg)
-        record_header = struct.pack('>I', 0x80000000 | msg_len)
-
         # Connect and send
         print("Sending NFS NULL request...")
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(5.0)
-        sock.connect((host, port))
-        sock.sendall(record_header + call_msg)
-
-        # Receive response
-        print("Waiting for response...")
-        reply_header_bytes = sock.recv(4)
-        if len(reply_header_bytes) != 4:
-            print("  ✗ Failed to read response header")
-            sock.close()
-            sys.exit(1)
-
-        reply_header = struct.unpack('>I', reply_header_bytes)[0]
-        is_last = (reply_header & 0x80000000) != 0
-        reply_len = reply_header & 0x7FFFFFFF
-
-        print(f"  Response header: is_last={is_last}, length={reply_len}")
-
-        # Read response data
-        reply_data = b''
-        while len(reply_data) < reply_len:
-            chunk = sock.recv(reply_len - len(reply_data))
-            if not chunk:
-                break
-            reply_data += chunk
+        with _connect(host, port) as sock:
+            sock.sendall(_NULL_RECORD)
 
-        sock.close()
+            # Receive response
+            print("Waiting for response...")
+            reply_data = recv_reply(sock)
 
         print(f"  Received {len(reply_data)} bytes")
 
         # Parse RPC reply header
-        # Format: xid(4) + reply_stat(4) + verf_flavor(4) + verf_len(4) + accept_stat(4)
-        if len(reply_data) < 24:
+        # Format (24 bytes): xid(4) + msg_type(4) + reply_stat(4) + verf_flavor(4) +
+        # verf_len(4) + accept_stat(4)
+        if len(reply_data) < _RPC_REPLY_HDR.size:
             print(f"  ✗ Response too short: {len(reply_data)} bytes")
             sys.exit(1)
 
-        reply_xid, msg_type, reply_stat, verf_flavor, verf_len, accept_stat = struct.unpack(
-            '>IIIIII', reply_data[:24]
+        reply_xid, msg_type, reply_stat, verf_flavor, verf_len, accept_stat = (
+            _RPC_REPLY_HDR.unpack_from(reply_data)
         )
 
         print(f"  Reply XID: {reply_xid}")
@@ -4,287 +4,133 @@ Test: NFS REMOVE Procedure
 Purpose: Test file removal functionality
 """
 
-import socket
-import struct
 import sys
 
+from _nfs_rpc import (
+    _CREATEHOW_UNCHECKED_0644,
+    _U32,
+    _connect,
+    pack_string,
+    parse_rpc_reply,
+    parse_wcc_data,
+    rpc_call,
+    unpack_opaque_flex,
+)
 
-def pack_string(s):
-    """Pack a string as XDR string"""
-    data = s.encode('utf-8')
-    length = len(data)
-    padding = (4 - (length % 4)) % 4
-    return struct.pack('>I', length) + data + b'\x00' * padding
-
-
-def unpack_opaque_flex(data, offset):
-    """Unpack variable-length opaque data (length + data)"""
-    length = struct.unpack('>I', data[offset:offset+4])[0]
-    opaque_data = data[offset+4:offset+4+length]
-    padding = (4 - (length % 4)) % 4
-    next_offset = offset + 4 + length + padding
-    return opaque_data, next_offset
-
-
-def rpc_call(host, port, xid, prog, vers, proc, args_data):
-    """Make an RPC call and return the response"""
-    # Build RPC call header
-    message = b''
-    message += struct.pack('>I', xid)      # XID
-    message += struct.pack('>I', 0)        # msg_type = CALL (0)
-    message += struct.pack('>I', 2)        # RPC version
-    message += struct.pack('>I', prog)     # Program
-    message += struct.pack('>I', vers)     # Version
-    message += struct.pack('>I', proc)     # Procedure
-    # cred (AUTH_NONE)
-    message += struct.pack('>I', 0)        # flavor = AUTH_NONE
-    message += struct.pack('>I', 0)        # length = 0
-    # verf (AUTH_NONE)
-    message += struct.pack('>I', 0)        # flavor = AUTH_NONE
-    message += struct.pack('>I', 0)        # length = 0
-
-    # Add procedure arguments
-    call_msg = message + args_data
-
-    # Add RPC record marking
-    msg_len = len(call_msg)
-    record_header = struct.pack('>I', 0x80000000 | msg_len)
-
-    # Connect and send
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.settimeout(5.0)
-    sock.connect((host, port))
-    sock.sendall(record_header + call_msg)
-
-    # Receive response
-    reply_header_bytes = sock.recv(4)
-    if len(reply_header_bytes) != 4:
-        sock.close()
-        raise Exception("Failed to read response header")
-
-    reply_header = struct.unpack('>I', reply_header_bytes)[0]
-    is_last = (reply_header & 0x80000000) != 0
-    reply_len = reply_header & 0x7FFFFFFF
-
-    print(f"  Response header: is_last={is_last}, length={reply_len}")
-
-    # Read response data
-    reply_data = b''
-    while len(reply_data) < reply_len:
-        chunk = sock.recv(reply_len - len(reply_data))
-        if not chunk:
-            break
-        reply_data += chunk
-
-    sock.close()
-    return reply_data
-
-
-def parse_rpc_reply(reply_data):
-    """Parse RPC reply header"""
-    if len(reply_data) < 24:
-        raise Exception(f"Response too short: {len(reply_data)} bytes")
-
-    reply_xid, msg_type, reply_stat, verf_flavor, verf_len, accept_stat = struct.unpack(
-        '>IIIIII', reply_data[:24]
-    )
-
-    print(f"  Reply XID: {reply_xid}")
-    print(f"  Reply stat: {reply_stat} (0=MSG_ACCEPTED)")
-    print(f"  Accept stat: {accept_stat} (0=SUCCESS)")
-
-    if reply_stat != 0 or accept_stat != 0:
-        raise Exception(f"RPC error: reply_stat={reply_stat}, accept_stat={accept_stat}")
-
-    return 24  # Return offset to NFS data
-
-
-def parse_wcc_data(reply_data, offset):
-    """
-    Parse wcc_data structure (RFC 1813)
+# MNT3args for the export both tests mount
+_MOUNT_EXPORT_ARGS = pack_string("/tmp/nfs_exports")
 
-    wcc_data = {
-        pre_op_attr:  bool + optional wcc_attr (24 bytes if present)
-        post_op_attr: bool + optional fattr3 (84 bytes if present)
-    }
 
-    Returns: (pre_attr_dict, post_attr_dict, next_offset)
+def pack_diropargs(dir_handle, name, tail=b''):
     """
-    start_offset = offset
-
-    # 1. Parse pre_op_attr
-    pre_attr_follows = struct.unpack('>I', reply_data[offset:offset+4])[0]
-    offset += 4
-
-    pre_attr = None
-    if pre_attr_follows:
-        # wcc_attr = size(8) + mtime(8) + ctime(8) = 24 bytes
-        size = struct.unpack('>Q', reply_data[offset:offset+8])[0]
-        offset += 8
-        mtime_sec, mtime_nsec = struct.unpack('>II', reply_data[offset:offset+8])
-        offset += 8
-        ctime_sec, ctime_nsec = struct.unpack('>II', reply_data[offset:offset+8])
-        offset += 8
-        pre_attr = {
-            'size': size,
-            'mtime': (mtime_sec, mtime_nsec),
-            'ctime': (ctime_sec, ctime_nsec)
-        }
-
-    # 2. Parse post_op_attr
-    post_attr_follows = struct.unpack('>I', reply_data[offset:offset+4])[0]
-    offset += 4
+    Pack diropargs3 (dir fhandle3 + filename3) plus any fixed tail in place
 
-    post_attr = None
-    if post_attr_follows:
-        # fattr3 = 84 bytes
-        fattr_start = offset
-        ftype = struct.unpack('>I', reply_data[offset:offset+4])[0]
-        mode = struct.unpack('>I', reply_data[offset+4:offset+8])[0]
-        nlink = struct.unpack('>I', reply_data[offset+8:offset+12])[0]
-        uid = struct.unpack('>I', reply_data[offset+12:offset+16])[0]
-        gid = struct.unpack('>I', reply_data[offset+16:offset+20])[0]
-        size = struct.unpack('>Q', reply_data[offset+20:offset+28])[0]
-        offset += 84
-
-        post_attr = {
-            'type': ftype,
-            'mode': mode,
-            'nlink': nlink,
-            'uid': uid,
-            'gid': gid,
-            'size': size
-        }
-
-    # Validate total wcc_data size
-    expected_size = 4 + (24 if pre_attr_follows else 0) + 4 + (84 if post_attr_follows else 0)
-    actual_size = offset - start_offset
-    if actual_size != expected_size:
-        raise Exception(f"wcc_data size mismatch: expected {expected_size}, got {actual_size}")
-
-    return pre_attr, post_attr, offset
+    Returns: bytearray holding the complete procedure arguments
+    """
+    fh_len = len(dir_handle)
+    name_data = name.encode('utf-8')
+    name_len = len(name_data)
+    name_off = 4 + fh_len + (-fh_len & 3)
+    tail_off = name_off + 4 + name_len + (-name_len & 3)
+
+    # Padding bytes are already zero in a fresh bytearray
+    args = bytearray(tail_off + len(tail))
+    _U32.pack_into(args, 0, fh_len)
+    args[4:4 + fh_len] = dir_handle
+    _U32.pack_into(args, name_off, name_len)
+    args[name_off + 4:name_off + 4 + name_len] = name_data
+    args[tail_off:] = tail
+    return args
 
 
 def test_remove(host, port):
     """Test REMOVE procedure"""
     print("\n=== Test: NFS REMOVE ===")
 
-    # Step 1: Mount to get root file handle
-    print("\n1. Calling MOUNT...")
-    mount_args = pack_string("/tmp/nfs_exports")
-    mount_reply = rpc_call(host, port, 1, 100005, 3, 1, mount_args)
-    offset = parse_rpc_reply(mount_reply)
+    # All of this test's calls share one connection; it is closed once the
+    # last reply is in
+    with _connect(host, port) as sock:
+        # Step 1: Mount to get root file handle
+        print("\n1. Calling MOUNT...")
+        mount_args = _MOUNT_EXPORT_ARGS
+        mount_reply = rpc_call(sock, 1, 100005, 3, 1, mount_args)
+        offset = parse_rpc_reply(mount_reply)
 
-    # Parse MOUNT reply
-    status = struct.unpack('>I', mount_reply[offset:offset+4])[0]
-    if status != 0:
-        raise Exception(f"MOUNT failed with status {status}")
-    offset += 4
+        # Parse MOUNT reply
+        status = _U32.unpack_from(mount_reply, offset)[0]
+        if status != 0:
+            raise Exception(f"MOUNT failed with status {status}")
+        offset += 4
 
-    root_handle, offset = unpack_opaque_flex(mount_reply, offset)
-    print(f"  Got root handle: {len(root_handle)} bytes")
+        root_handle, offset = unpack_opaque_flex(mount_reply, offset)
+        print(f"  Got root handle: {len(root_handle)} bytes")
 
-    # Step 2: CREATE a test file first
-    print("\n2. Creating test file 'test_remove.txt'...")
-    create_args = b''
+        # Step 2: CREATE a test file first
+        print("\n2. Creating test file 'test_remove.txt'...")
+        # where_dir (fhandle3) + name (filename3) + how (createhow3)
+        create_args = pack_diropargs(root_handle, "test_remove.txt", _CREATEHOW_UNCHECKED_0644)
 
-    # where_dir (fhandle3)
-    create_args += struct.pack('>I', len(root_handle))
-    create_args += root_handle
-    padding = (4 - (len(root_handle) % 4)) % 4
-    create_args += b'\x00' * padding
+        create_reply = rpc_call(sock, 2, 100003, 3, 8, create_args)
+        offset = parse_rpc_reply(create_reply)
 
-    # name (filename3)
-    create_args += pack_string("test_remove.txt")
+        status = _U32.unpack_from(create_reply, offset)[0]
+        if status != 0:
+            raise Exception(f"CREATE failed with status {status}")
 
-    # how (createhow3) - UNCHECKED mode
-    create_args += struct.pack('>I', 0)  # mode = UNCHECKED
+        print("  File created successfully")
 
-    # sattr3 (attributes)
-    create_args += struct.pack('>I', 1)     # set_mode = SET_MODE
-    create_args += struct.pack('>I', 0o644) # mode value
-    create_args += struct.pack('>I', 0)     # set_uid = default
-    create_args += struct.pack('>I', 0)     # set_gid = default
-    create_args += struct.pack('>I', 0)     # set_size = default
-    create_args += struct.pack('>I', 0)     # set_atime = default
-    create_args += struct.pack('>I', 0)     # set_mtime = default
+        # Step 3: REMOVE the file
+        print("\n3. Calling REMOVE to delete 'test_remove.txt'...")
+        # dir (fhandle3) + name (filename3)
+        remove_args = pack_diropargs(root_handle, "test_remove.txt")
 
-    create_reply = rpc_call(host, port, 2, 100003, 3, 8, create_args)
-    offset = parse_rpc_reply(create_reply)
+        remove_reply = rpc_call(sock, 3, 100003, 3, 12, remove_args)
+        offset = parse_rpc_reply(remove_reply)
 
-    status = struct.unpack('>I', create_reply[offset:offset+4])[0]
-    if status != 0:
-        raise Exception(f"CREATE failed with status {status}")
+        # Parse REMOVE reply
+        status = _U32.unpack_from(remove_reply, offset)[0]
+        offset += 4
 
-    print("  File created successfully")
+        if status != 0:
+            raise Exception(f"REMOVE failed with status {status}")
 
-    # Step 3: REMOVE the file
-    print("\n3. Calling REMOVE to delete 'test_remove.txt'...")
-    remove_args = b''
+        print(f"  REMOVE status: NFS3_OK (0)")
 
-    # dir (fhandle3)
-    remove_args += struct.pack('>I', len(root_handle))
-    remove_args += root_handle
-    padding = (4 - (len(root_handle) % 4)) % 4
-    remove_args += b'\x00' * padding
+        # Parse wcc_data (dir_wcc) - RFC 1813 format
+        pre_attr, post_attr, offset = parse_wcc_data(remove_reply, offset)
 
-    # name (filename3)
-    remove_args += pack_string("test_remove.txt")
+        if pre_attr:
+            print(f"  Directory pre_op_attr: size={pre_attr['size']}")
+        else:
+            print(f"  Directory pre_op_attr: not present")
 
-    remove_reply = rpc_call(host, port, 3, 100003, 3, 12, remove_args)
-    offset = parse_rpc_reply(remove_reply)
+        if post_attr:
+            print(f"  Directory post_op_attr: present (mode={oct(post_attr['mode'])}, size={post_attr['size']})")
+        else:
+            print(f"  Directory post_op_attr: not present")
 
-    # Parse REMOVE reply
-    status = struct.unpack('>I', remove_reply[offset:offset+4])[0]
-    offset += 4
+        # Validate exact response length
+        expected_rpc_header = 24  # RPC reply header
+        expected_nfs_status = 4   # nfsstat3
+        expected_wcc_data = 4 + (24 if pre_attr else 0) + 4 + (84 if post_attr else 0)
+        expected_total = expected_rpc_header + expected_nfs_status + expected_wcc_data
 
-    if status != 0:
-        raise Exception(f"REMOVE failed with status {status}")
+        if len(remove_reply) != expected_total:
+            raise Exception(f"Response length mismatch: expected {expected_total}, got {len(remove_reply)}")
 
-    print(f"  REMOVE status: NFS3_OK (0)")
+        print(f"  ✓ Response format validation passed (length={len(remove_reply)} bytes)")
+        print(f"  Total response size: {len(remove_reply)} bytes")
 
-    # Parse wcc_data (dir_wcc) - RFC 1813 format
-    pre_attr, post_attr, offset = parse_wcc_data(remove_reply, offset)
+        # Step 4: Verify file was removed by trying to LOOKUP
+        print("\n4. Verifying file was removed (LOOKUP should fail)...")
+        # dir (fhandle3) + name (filename3)
+        lookup_args = pack_diropargs(root_handle, "test_remove.txt")
 
-    if pre_attr:
-        print(f"  Directory pre_op_attr: size={pre_attr['size']}")
-    else:
-        print(f"  Directory pre_op_attr: not present")
-
-    if post_attr:
-        print(f"  Directory post_op_attr: present (mode={oct(post_attr['mode'])}, size={post_attr['size']})")
-    else:
-        print(f"  Directory post_op_attr: not present")
+        lookup_reply = rpc_call(sock, 4, 100003, 3, 3, lookup_args)
 
-    # Validate exact response length
-    expected_rpc_header = 24  # RPC reply header
-    expected_nfs_status = 4   # nfsstat3
-    expected_wcc_data = 4 + (24 if pre_attr else 0) + 4 + (84 if post_attr else 0)
-    expected_total = expected_rpc_header + expected_nfs_status + expected_wcc_data
-
-    if len(remove_reply) != expected_total:
-        raise Exception(f"Response length mismatch: expected {expected_total}, got {len(remove_reply)}")
-
-    print(f"  ✓ Response format validation passed (length={len(remove_reply)} bytes)")
-    print(f"  Total response size: {len(remove_reply)} bytes")
-
-    # Step 4: Verify file was removed by trying to LOOKUP
-    print("\n4. Verifying file was removed (LOOKUP should fail)...")
-    lookup_args = b''
-
-    # dir (fhandle3)
-    lookup_args += struct.pack('>I', len(root_handle))
-    lookup_args += root_handle
-    padding = (4 - (len(root_handle) % 4)) % 4
-    lookup_args += b'\x00' * padding
-
-    # name (filename3)
-    lookup_args += pack_string("test_remove.txt")
-
-    lookup_reply = rpc_call(host, port, 4, 100003, 3, 3, lookup_args)
     offset = parse_rpc_reply(lookup_reply)
 
-    status = struct.unpack('>I', lookup_reply[offset:offset+4])[0]
+    status = _U32.unpack_from(lookup_reply, offset)[0]
     if status == 2:  # NFS3ERR_NOENT = 2
         print("  ✓ LOOKUP failed with NOENT - file was successfully removed")
     else:
@@ -297,38 +143,34 @@ def test_remove_nonexistent(host, port):
     """Test REMOVE on nonexistent file"""
     print("\n=== Test: REMOVE Nonexistent File ===")
 
-    # Step 1: Mount to get root file handle
-    print("\n1. Calling MOUNT...")
-    mount_args = pack_string("/tmp/nfs_exports")
-    mount_reply = rpc_call(host, port, 5, 100005, 3, 1, mount_args)
-    offset = parse_rpc_reply(mount_reply)
-
-    status = struct.unpack('>I', mount_reply[offset:offset+4])[0]
-    if status != 0:
-        raise Exception(f"MOUNT failed with status {status}")
-    offset += 4
+    # All of this test's calls share one connection; it is closed once the
+    # last reply is in
+    with _connect(host, port) as sock:
+        # Step 1: Mount to get root file handle
+        print("\n1. Calling MOUNT...")
+        mount_args = _MOUNT_EXPORT_ARGS
+        mount_reply = rpc_call(sock, 5, 100005, 3, 1, mount_args)
+        offset = parse_rpc_reply(mount_reply)
 
-    root_handle, offset = unpack_opaque_flex(mount_reply, offset)
-    print(f"  Got root handle: {len(root_handle)} bytes")
+        status = _U32.unpack_from(mount_reply, offset)[0]
+        if status != 0:
+            raise Exception(f"MOUNT failed with status {status}")
+        offset += 4
 
-    # Step 2: Try to REMOVE nonexistent file
-    print("\n2. Trying to REMOVE nonexistent file 'does_not_exist.txt'...")
-    remove_args = b''
+        root_handle, offset = unpack_opaque_flex(mount_reply, offset)
+        print(f"  Got root handle: {len(root_handle)} bytes")
 
-    # dir (fhandle3)
-    remove_args += struct.pack('>I', len(root_handle))
-    remove_args += root_handle
-    padding = (4 - (len(root_handle) % 4)) % 4
-    remove_args += b'\x00' * padding
+        # Step 2: Try to REMOVE nonexistent file
+        print("\n2. Trying to REMOVE nonexistent file 'does_not_exist.txt'...")
+        # dir (fhandle3) + name (filename3)
+        remove_args = pack_diropargs(root_handle, "does_not_exist.txt")
 
-    # name (filename3)
-    remove_args += pack_string("does_not_exist.txt")
+        remove_reply = rpc_call(sock, 6, 100003, 3, 12, remove_args)
 
-    remove_reply = rpc_call(host, port, 6, 100003, 3, 12, remove_args)
     offset = parse_rpc_reply(remove_reply)
 
     # Parse REMOVE reply
-    status = struct.unpack('>I', remove_reply[offset:offset+4])[0]
+    status = _U32.unpack_from(remove_reply, offset)[0]
     offset += 4
 
     if status == 2:  # NFS3ERR_NOENT = 2
@@ -5,109 +5,43 @@ Test NFS RENAME Procedure (14)
 Tests the NFSv3 RENAME operation which renames or moves files/directories.
 """
 
-import socket
-import struct
 import sys
 
+from _nfs_rpc import (
+    _MOUNT_ROOT_ARGS,
+    _RPC_REPLY_HDR,
+    _U32,
+    _connect,
+    pack_call,
+    pack_opaque,
+    pack_string,
+    recv_reply,
+    skip_wcc_data,
+    unpack_opaque_flex,
+)
 
-def pack_rpc_call(xid, prog, vers, proc, auth_flavor=0, auth_len=0, verf_flavor=0, verf_len=0):
-    """Pack RPC call header"""
-    rpc_header = struct.pack(
-        '>IIIIIIII',
-        xid,         # XID
-        0,           # Message type (0 = CALL)
-        2,           # RPC version
-        prog,        # Program
-        vers,        # Version
-        proc,        # Procedure
-        auth_flavor, # Auth flavor
-        auth_len     # Auth length
-    )
-
-    verf = struct.pack('>II', verf_flavor, verf_len)
-    return rpc_header + verf
-
-
-def pack_fhandle3(handle):
-    """Pack file handle (length + data + padding)"""
-    handle_len = len(handle)
-    packed = struct.pack('>I', handle_len)
-    packed += handle
-    padding = (4 - (handle_len % 4)) % 4
-    packed += b'\x00' * padding
-    return packed
-
-
-def pack_filename3(name):
-    """Pack filename (length + string + padding)"""
-    name_bytes = name.encode('utf-8')
-    name_len = len(name_bytes)
-    packed = struct.pack('>I', name_len)
-    packed += name_bytes
-    padding = (4 - (name_len % 4)) % 4
-    packed += b'\x00' * padding
-    return packed
+# createhow3 UNCHECKED (0) + sattr3 with every field DONT_SET (6 zero discriminators)
+_CREATEHOW_UNCHECKED_DONTSET = bytes(28)
 
+# Record-marked MOUNT "/" call shared by both tests; only the XID (at offset 4)
+# is patched before each send
+_MOUNT_FRAME = pack_call(0, 100005, 3, 1, _MOUNT_ROOT_ARGS)  # MOUNT (proc 1)
 
-def pack_rename3args(from_dir_handle, from_name, to_dir_handle, to_name):
-    """Pack RENAME3args structure"""
-    packed = pack_fhandle3(from_dir_handle)
-    packed += pack_filename3(from_name)
-    packed += pack_fhandle3(to_dir_handle)
-    packed += pack_filename3(to_name)
-    return packed
-
-
-def unpack_opaque_flex(data, offset):
-    """Unpack variable-length opaque data (length + data + padding)"""
-    length = struct.unpack('>I', data[offset:offset+4])[0]
-    offset += 4
-    opaque_data = data[offset:offset+length]
-    padding = (4 - (length % 4)) % 4
-    offset += length + padding
-    return opaque_data, offset
-
-
-def parse_wcc_data(reply_data, offset):
-    """
-    Parse wcc_data structure (RFC 1813 Section 3.3.6)
-
-    wcc_data = {
-        before: pre_op_attr   (bool + optional 24 bytes)
-        after:  post_op_attr  (bool + optional 84 bytes)
-    }
-    """
-    start_offset = offset
-
-    # Parse pre_op_attr
-    pre_attr_follows = struct.unpack('>I', reply_data[offset:offset+4])[0]
-    offset += 4
 
-    if pre_attr_follows:
-        # wcc_attr = 24 bytes (size:8 + mtime:8 + ctime:8)
-        size = struct.unpack('>Q', reply_data[offset:offset+8])[0]
-        offset += 8
-        mtime_sec, mtime_nsec = struct.unpack('>II', reply_data[offset:offset+8])
-        offset += 8
-        ctime_sec, ctime_nsec = struct.unpack('>II', reply_data[offset:offset+8])
-        offset += 8
+def send_mount(sock, xid):
+    """Send the cached MOUNT "/" call with the given XID"""
+    _U32.pack_into(_MOUNT_FRAME, 4, xid)
+    sock.sendall(_MOUNT_FRAME)
 
-    # Parse post_op_attr
-    post_attr_follows = struct.unpack('>I', reply_data[offset:offset+4])[0]
-    offset += 4
 
-    if post_attr_follows:
-        # fattr3 = 84 bytes
-        offset += 84
-
-    # Validate wcc_data size
-    expected_size = 4 + (24 if pre_attr_follows else 0) + 4 + (84 if post_attr_follows else 0)
-    actual_size = offset - start_offset
-
-    if actual_size != expected_size:
-        raise Exception(f"wcc_data size mismatch: expected {expected_size}, got {actual_size}")
-
-    return offset
+def pack_rename3args(from_dir_handle, from_name, to_dir_handle, to_name):
+    """Pack RENAME3args structure"""
+    return b''.join((
+        pack_opaque(from_dir_handle),
+        pack_string(from_name),
+        pack_opaque(to_dir_handle),
+        pack_string(to_name),
+    ))
 
 
 def test_rename_file(server_ip, server_port):
@@ -117,56 +51,44 @@ def test_rename_file(server_ip, server_port):
     print("Testing NFS RENAME Procedure (14) - File Rename")
     print("=" * 60)
 
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.connect((server_ip, server_port))
+    sock = _connect(server_ip, server_port)
 
     try:
         # Step 1: MOUNT to get root handle
         print("\n[1] Getting root handle via MOUNT...")
         xid = 0x12345680
-        rpc_call = pack_rpc_call(xid, 100005, 3, 1)  # MOUNT (proc 1)
-        mount_args = pack_filename3("/")
-
-        msg = rpc_call + mount_args
-        record_marker = struct.pack('>I', 0x80000000 | len(msg))
-        sock.send(record_marker + msg)
+        send_mount(sock, xid)
 
-        header = sock.recv(4)
-        response_len = struct.unpack('>I', header)[0] & 0x7FFFFFFF
-        reply_data = sock.recv(response_len)
+        reply_data = recv_reply(sock)
 
         offset = 24
-        status = struct.unpack('>I', reply_data[offset:offset+4])[0]
+        status = _U32.unpack_from(reply_data, offset)[0]
         if status != 0:
             print(f"  ERROR: MOUNT failed")
             return False
 
-        root_handle, _ = unpack_opaque_flex(reply_data, offset + 4)
+        root_handle = unpack_opaque_flex(reply_data, offset + 4)[0]
         print(f"  Got root handle: {root_handle.hex()} ({len(root_handle)} bytes)")
 
         # Step 2: Create a test file using CREATE
         print("\n[2] Creating test file 'oldname.txt'...")
         xid = 0x12345681
-        rpc_call = pack_rpc_call(xid, 100003, 3, 8)  # CREATE (proc 8)
 
-        # CREATE3args: dir handle + filename + how (createhow3 = UNCHECKED + sattr3)
-        create_args = pack_fhandle3(root_handle)
-        create_args += pack_filename3("oldname.txt")
-        create_args += struct.pack('>I', 0)  # UNCHECKED mode
-        # sattr3: all fields set to DONT_SET (discriminator = 0)
-        for _ in range(6):  # mode, uid, gid, size, atime, mtime
-            create_args += struct.pack('>I', 0)
+        # CREATE3args: dir handle + filename + how (createhow3 = UNCHECKED + sattr3
+        # with mode, uid, gid, size, atime, mtime all DONT_SET)
+        create_args = b''.join((
+            pack_opaque(root_handle),
+            pack_string("oldname.txt"),
+            _CREATEHOW_UNCHECKED_DONTSET,
+        ))
 
-        msg = rpc_call + create_args
-        record_marker = struct.pack('>I', 0x80000000 | len(msg))
-        sock.send(record_marker + msg)
+        # Marker, call header and arguments go out as one buffer
+        sock.sendall(pack_call(xid, 100003, 3, 8, create_args))  # CREATE (proc 8)
 
-        header = sock.recv(4)
-        response_len = struct.unpack('>I', header)[0] & 0x7FFFFFFF
-        reply_data = sock.recv(response_len)
+        reply_data = recv_reply(sock)
 
         offset = 24
-        status = struct.unpack('>I', reply_data[offset:offset+4])[0]
+        status = _U32.unpack_from(reply_data, offset)[0]
         if status != 0:
             print(f"  ERROR: CREATE failed with status {status}")
             return False
@@ -175,27 +97,22 @@ def test_rename_file(server_ip, server_port):
         # Step 3: Rename the file
         print("\n[3] Renaming 'oldname.txt' to 'newname.txt'...")
         xid = 0x12345682
-        rpc_call = pack_rpc_call(xid, 100003, 3, 14)  # RENAME (proc 14)
 
         rename_args = pack_rename3args(root_handle, "oldname.txt", root_handle, "newname.txt")
 
-        msg = rpc_call + rename_args
-        record_marker = struct.pack('>I', 0x80000000 | len(msg))
-        sock.send(record_marker + msg)
+        sock.sendall(pack_call(xid, 100003, 3, 14, rename_args))  # RENAME (proc 14)
 
-        header = sock.recv(4)
-        response_len = struct.unpack('>I', header)[0] & 0x7FFFFFFF
-        reply_data = sock.recv(response_len)
+        reply_data = recv_reply(sock)
 
         # Parse RPC reply header
         (reply_xid, msg_type, reply_stat, verf_flavor, verf_len, accept_stat) = \
-            struct.unpack('>IIIIII', reply_data[:24])
+            _RPC_REPLY_HDR.unpack_from(reply_data, 0)
 
         print(f"  RENAME XID: {hex(reply_xid)}, accept_stat: {accept_stat}")
 
         # Parse RENAME3res
         offset = 24
-        status = struct.unpack('>I', reply_data[offset:offset+4])[0]
+        status = _U32.unpack_from(reply_data, offset)[0]
         offset += 4
 
         print(f"  Status: {status} (0=NFS3_OK)")
@@ -204,9 +121,9 @@ def test_rename_file(server_ip, server_port):
             print(f"  ERROR: RENAME failed with status {status}")
             # Still parse wcc_data for failure case
             print(f"\n  Parsing fromdir_wcc...")
-            offset = parse_wcc_data(reply_data, offset)
+            offset = skip_wcc_data(reply_data, offset)
             print(f"  Parsing todir_wcc...")
-            offset = parse_wcc_data(reply_data, offset)
+            offset = skip_wcc_data(reply_data, offset)
             return False
 
         # Success case: parse fromdir_wcc + todir_wcc
@@ -214,11 +131,11 @@ def test_rename_file(server_ip, server_port):
 
         # Parse fromdir_wcc (source directory wcc_data)
         print(f"  Parsing fromdir_wcc (source directory)...")
-        offset = parse_wcc_data(reply_data, offset)
+        offset = skip_wcc_data(reply_data, offset)
 
         # Parse todir_wcc (target directory wcc_data)
         print(f"  Parsing todir_wcc (target directory)...")
-        offset = parse_wcc_data(reply_data, offset)
+        offset = skip_wcc_data(reply_data, offset)
 
         print(f"\n  Total response size: {len(reply_data)} bytes")
         print(f"  Parsed offset: {offset} bytes")
@@ -242,59 +159,46 @@ def test_rename_nonexistent(server_ip, server_port):
     print("Testing RENAME on non-existent file")
     print("=" * 60)
 
-    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    sock.connect((server_ip, server_port))
+    sock = _connect(server_ip, server_port)
 
     try:
         # First get root handle via MOUNT
         print("\n[1] Getting root handle via MOUNT...")
         xid = 0x12345683
-        rpc_call = pack_rpc_call(xid, 100005, 3, 1)  # MOUNT (proc 1)
-        mount_args = pack_filename3("/")
-
-        msg = rpc_call + mount_args
-        record_marker = struct.pack('>I', 0x80000000 | len(msg))
-        sock.send(record_marker + msg)
+        send_mount(sock, xid)
 
-        header = sock.recv(4)
-        response_len = struct.unpack('>I', header)[0] & 0x7FFFFFFF
-        reply_data = sock.recv(response_len)
+        reply_data = recv_reply(sock)
 
         offset = 24
-        status = struct.unpack('>I', reply_data[offset:offset+4])[0]
+        status = _U32.unpack_from(reply_data, offset)[0]
         if status != 0:
             print(f"  ERROR: MOUNT failed")
             return False
 
-        root_handle, _ = unpack_opaque_flex(reply_data, offset + 4)
+        root_handle = unpack_opaque_flex(reply_data, offset + 4)[0]
 
         print("\n[2] Attempting to rename non-existent file 'nosuchfile.txt'...")
         xid = 0x12345684
-        rpc_call = pack_rpc_call(xid, 100003, 3, 14)  # RENAME (proc 14)
 
         rename_args = pack_rename3args(root_handle, "nosuchfile.txt", root_handle, "renamed.txt")
 
-        msg = rpc_call + rename_args
-        record_marker = struct.pack('>I', 0x80000000 | len(msg))
-        sock.send(record_marker + msg)
+        sock.sendall(pack_call(xid, 100003, 3, 14, rename_args))  # RENAME (proc 14)
 
         # Receive response
-        header = sock.recv(4)
-        response_len = struct.unpack('>I', header)[0] & 0x7FFFFFFF
-        reply_data = sock.recv(response_len)
+        reply_data = recv_reply(sock)
 
         # Parse response
         offset = 24  # Skip RPC header
-        status = struct.unpack('>I', reply_data[offset:offset+4])[0]
+        status = _U32.unpack_from(reply_data, offset)[0]
         offset += 4
 
         print(f"  Status: {status} (2=NFS3ERR_NOENT expected)")
 
         # Parse fromdir_wcc and todir_wcc (present in both success and failure cases)
         print(f"\n  Parsing fromdir_wcc...")
-        offset = parse_wcc_data(reply_data, offset)
+        offset = skip_wcc_data(reply_data, offset)
         print(f"  Parsing todir_wcc...")
-        offset = parse_wcc_data(reply_data, offset)
+        offset = skip_wcc_data(reply_data, offset)
 
         if offset != len(reply_data):
             print(f"  WARNING: Response size mismatch!")
@@ -13,6 +13,29 @@ import socket
 import struct
 import sys
 
+from _nfs_rpc import _U32, _connect, recv_reply
+
+# GETPORT call: RPC call header (10 words) + mapping argument (4 words)
+_PMAP_CALL = struct.Struct('>14I')
+# Offsets into the record-marked call frame of the fields that vary per query
+_PMAP_XID_OFF = 4
+_PMAP_MAPPING_OFF = 4 + 40
+_PMAP_MAPPING = struct.Struct('>3I')   # prog, vers, prot
+# GETPORT reply: xid, msg_type, reply_stat, verf, accept_stat + port
+_PMAP_REPLY = struct.Struct('>7I')
+
+
+def _pmap_connect(host, port):
+    """Connect to the portmapper, exiting if the server is unreachable"""
+    try:
+        return _connect(host, port)
+    except socket.timeout:
+        print(f"  ✗ Connection timeout")
+        sys.exit(1)
+    except ConnectionRefusedError:
+        print(f"  ✗ Connection refused - is server running?")
+        sys.exit(1)
+
 
 def test_portmap_getport():
     """Test Portmapper GETPORT procedure"""
@@ -40,94 +63,86 @@ def test_portmap_getport():
         (999999, 1, 6, "Non-existent service"),
     ]
 
-    for prog, vers, prot, description in queries:
-        print(f"Query: {description}")
-        print(f"  prog={prog}, vers={vers}, prot={prot}")
-
-        try:
-            # Build RPC call header
-            rpc_header = struct.pack(
-                '>IIIII II II',
-                xid,        # XID
-                2,          # RPC version
-                100000,     # Program (Portmapper)
-                2,          # Version (v2)
-                3,          # Procedure (GETPORT)
-                0, 0,       # cred (AUTH_NONE)
-                0, 0        # verf (AUTH_NONE)
-            )
-
-            # Build mapping argument (prog, vers, prot, port)
-            # Note: port is ignored in GETPORT query
-            mapping_arg = struct.pack('>IIII', prog, vers, prot, 0)
-
-            # Complete call message
-            call_msg = rpc_header + mapping_arg
-
-            # Add RPC record marking
-            msg_len = len(call_msg)
-            record_header = struct.pack('>I', 0x80000000 | msg_len)
-
-            # Connect and send
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5.0)
-            sock.connect((host, port))
-            sock.sendall(record_header + call_msg)
-
-            # Receive response
-            reply_header_bytes = sock.recv(4)
-            if len(reply_header_bytes) != 4:
-                print(f"  ✗ Failed to read response header")
-                sock.close()
-                continue
-
-            reply_header = struct.unpack('>I', reply_header_bytes)[0]
-            is_last = (reply_header & 0x80000000) != 0
-            reply_len = reply_header & 0x7FFFFFFF
-
-            # Read response data
-            reply_data = b''
-            while len(reply_data) < reply_len:
-                chunk = sock.recv(reply_len - len(reply_data))
-                if not chunk:
-                    break
-                reply_data += chunk
-
-            sock.close()
-
-            # Parse RPC reply header (20 bytes)
-            if len(reply_data) < 20:
-                print(f"  ✗ Response too short: {len(reply_data)} bytes")
-                continue
-
-            reply_xid, reply_stat, verf_flavor, verf_len, accept_stat = struct.unpack(
-                '>IIIII', reply_data[:20]
-            )
-
-            if reply_stat != 0 or accept_stat != 0:
-                print(f"  ✗ RPC error: reply_stat={reply_stat}, accept_stat={accept_stat}")
-                continue
-
-            # Parse port result (4 bytes after RPC header)
-            if len(reply_data) >= 24:
-                result_port = struct.unpack('>I', reply_data[20:24])[0]
+    # Connect once; every query is sent over the same connection
+    sock = _pmap_connect(host, port)
+
+    # Record-marked GETPORT call, built once; only the XID and the queried
+    # prog/vers/prot change between queries
+    frame = bytearray(4 + _PMAP_CALL.size)
+    _U32.pack_into(frame, 0, 0x80000000 | _PMAP_CALL.size)
+    _PMAP_CALL.pack_into(
+        frame, 4,
+        0,          # XID (patched per query)
+        0,          # msg_type = CALL (0)
+        2,          # RPC version
+        100000,     # Program (Portmapper)
+        2,          # Version (v2)
+        3,          # Procedure (GETPORT)
+        0, 0,       # cred (AUTH_NONE, length 0)
+        0, 0,       # verf (AUTH_NONE, length 0)
+        0, 0, 0,    # mapping prog, vers, prot (patched per query)
+        0           # mapping port; ignored in a GETPORT query
+    )
+
+    try:
+        for prog, vers, prot, description in queries:
+            print(f"Query: {description}")
+            print(f"  prog={prog}, vers={vers}, prot={prot}")
+
+            resync = False
+            try:
+                # Patch this query's XID and mapping into the template frame
+                call_xid = xid
+                xid += 1
+                _U32.pack_into(frame, _PMAP_XID_OFF, call_xid)
+                _PMAP_MAPPING.pack_into(frame, _PMAP_MAPPING_OFF, prog, vers, prot)
+                sock.sendall(frame)
+
+                # Receive response
+                reply_data = recv_reply(sock)
+
+                # Parse RPC reply header (24 bytes)
+                if len(reply_data) < 24:
+                    print(f"  ✗ Response too short: {len(reply_data)} bytes")
+                    continue
+
+                # Parse port result (4 bytes after RPC header)
+                if len(reply_data) < _PMAP_REPLY.size:
+                    print(f"  ✗ No port data in response")
+                    continue
+
+                (reply_xid, msg_type, reply_stat, verf_flavor, verf_len, accept_stat,
+                 result_port) = _PMAP_REPLY.unpack_from(reply_data)
+
+                if reply_xid != call_xid:
+                    # A reply to an earlier query; the stream is out of step
+                    raise Exception(f"XID mismatch: expected {call_xid}, got {reply_xid}")
+
+                if reply_stat != 0 or accept_stat != 0:
+                    print(f"  ✗ RPC error: reply_stat={reply_stat}, accept_stat={accept_stat}")
+                    continue
 
                 if result_port == 0:
                     print(f"  ✓ Service not found (port=0) - Expected for non-existent")
                 else:
                     print(f"  ✓ Service found on port {result_port}")
-            else:
-                print(f"  ✗ No port data in response")
-
-        except socket.timeout:
-            print(f"  ✗ Connection timeout")
-        except ConnectionRefusedError:
-            print(f"  ✗ Connection refused - is server running?")
-            sys.exit(1)
-        except Exception as e:
-            print(f"  ✗ Error: {e}")
-
-        print()
+
+            except socket.timeout:
+                print(f"  ✗ Connection timeout")
+                resync = True
+            except Exception as e:
+                print(f"  ✗ Error: {e}")
+                resync = True
+
+            if resync:
+                # A late or partial reply may still be in the stream, so the
+                # next query starts on a fresh connection
+                sock.close()
+                sock = _pmap_connect(host, port)
+
+            print()
+    finally:
+        sock.close()
 
     print("=" * 60)
     print("✅ Portmapper GETPORT test completed")